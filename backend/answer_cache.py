@@ -0,0 +1,155 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "10000"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "86400"))
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+
+
+def normalize_question(question):
+    return " ".join(re.sub(r"[^\w\s]", " ", question.lower()).split())
+
+
+class _Entry:
+    __slots__ = ("answer", "embedding", "expires_at")
+
+    def __init__(self, answer, embedding, expires_at):
+        self.answer = answer
+        self.embedding = embedding
+        self.expires_at = expires_at
+
+
+class AnswerCache:
+    """Two-tier cache of generated answers per document.
+
+    The exact tier matches ``(document_id, normalized question)``. The semantic
+    tier compares the question embedding against cached questions of the same
+    document and reuses an answer whose cosine similarity reaches
+    ``similarity_threshold``. Entries expire after ``ttl`` seconds and the
+    least recently used ones are evicted beyond ``max_entries``.
+
+    After ``invalidate(document_id, valid_after)`` stored answers with an id up
+    to ``valid_after`` belong to the old content and must not be seeded again.
+    """
+
+    def __init__(self, max_entries=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL,
+                 similarity_threshold=ANSWER_CACHE_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # (document_id, normalized question) -> _Entry
+        self._by_document = {}  # document_id -> set of keys
+        self._loaded = OrderedDict()  # documents whose stored answers were already pulled in
+        self._valid_after = {}  # document_id -> last stored answer id of the content before it changed
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def is_loaded(self, document_id):
+        return document_id in self._loaded
+
+    def valid_after(self, document_id):
+        """Only stored answers with a larger id may be seeded for ``document_id``."""
+        return self._valid_after.get(document_id, 0)
+
+    def load(self, document_id, pairs):
+        """Seed the exact tier with ``(question, answer)`` pairs already stored for a document."""
+        for question, answer in pairs:
+            self.put(document_id, question, answer)
+        with self._lock:
+            self._loaded[document_id] = True
+            self._loaded.move_to_end(document_id)
+            while len(self._loaded) > self.max_entries:
+                self._loaded.popitem(last=False)
+
+    def get_exact(self, document_id, question):
+        key = (document_id, normalize_question(question))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self._expire(key, entry):
+                return None
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            return entry.answer
+
+    def get_similar(self, document_id, embedding):
+        """Return the cached answer to the most similar question, or ``None`` (counted as a miss)."""
+        query = _normalize(embedding)
+        with self._lock:
+            candidates = []
+            for key in list(self._by_document.get(document_id, ())):
+                entry = self._entries[key]
+                if not self._expire(key, entry) and entry.embedding is not None:
+                    candidates.append((key, entry))
+            if candidates:
+                scores = np.stack([entry.embedding for _, entry in candidates]) @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity_threshold:
+                    key, entry = candidates[best]
+                    self._entries.move_to_end(key)
+                    self.semantic_hits += 1
+                    return entry.answer
+            self.misses += 1
+            return None
+
+    def put(self, document_id, question, answer, embedding=None):
+        key = (document_id, normalize_question(question))
+        if embedding is not None:
+            embedding = _normalize(embedding)
+        with self._lock:
+            self._entries[key] = _Entry(answer, embedding, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            self._by_document.setdefault(document_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest, _ = self._entries.popitem(last=False)
+                self._forget(oldest)
+
+    def invalidate(self, document_id, valid_after=None):
+        with self._lock:
+            for key in self._by_document.pop(document_id, ()):
+                self._entries.pop(key, None)
+            self._loaded.pop(document_id, None)
+            if valid_after is not None:
+                self._valid_after[document_id] = valid_after
+
+    def stats(self):
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+        }
+
+    def _expire(self, key, entry):
+        if entry.expires_at > time.monotonic():
+            return False
+        del self._entries[key]
+        self._forget(key)
+        return True
+
+    def _forget(self, key):
+        keys = self._by_document.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_document[key[0]]
+                # Seeding again later is cheap; remembering every document ever asked about is not
+                self._loaded.pop(key[0], None)
+
+
+def _normalize(vector):
+    vector = np.asarray(vector, dtype="float32").reshape(-1)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
@@ -0,0 +1,179 @@
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+
+logger = logging.getLogger(__name__)
+
+QA_MODEL = os.getenv("QA_MODEL", "google/flan-t5-large")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+QA_BACKEND = os.getenv("QA_BACKEND", "torch")  # torch, torch-int8, onnx or stub
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")  # torch, torch-int8, onnx or stub
+TORCH_THREADS = int(os.getenv("TORCH_THREADS", "0"))  # 0 keeps PyTorch's default
+ONNX_CACHE_DIR = os.getenv("ONNX_CACHE_DIR", "./onnx_models")
+
+
+def _configure_torch():
+    import torch
+
+    # Each inference worker gets its own share of cores instead of all of them
+    if TORCH_THREADS and torch.get_num_threads() != TORCH_THREADS:
+        torch.set_num_threads(TORCH_THREADS)
+    return torch
+
+
+def _quantize(torch, model):
+    # Dynamic int8 quantization of the Linear layers: weights are stored as
+    # int8, activations are quantized on the fly. CPU-only.
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class TorchGenerator:
+    """Seq2seq generation with PyTorch on CPU, optionally int8-quantized."""
+
+    def __init__(self, model_name=QA_MODEL, quantize=False):
+        torch = _configure_torch()
+        from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+
+        self._torch = torch
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        # Avoids a second full copy of the weights while loading. Each process
+        # holds its own copy afterwards, so process workers multiply the memory.
+        model = AutoModelForSeq2SeqLM.from_pretrained(model_name, low_cpu_mem_usage=True)
+        model.eval()
+        self.model = _quantize(torch, model) if quantize else model
+
+    def generate(self, prompts, max_new_tokens):
+        """Generate one answer per prompt in a single padded batch; returns ``(texts, generated_tokens)``."""
+        inputs = self.tokenizer(prompts, return_tensors="pt", padding=True)
+        with self._torch.inference_mode():
+            output = self.model.generate(**inputs, max_new_tokens=max_new_tokens)
+        texts = self.tokenizer.batch_decode(output, skip_special_tokens=True)
+        return texts, int((output != self.tokenizer.pad_token_id).sum())
+
+
+class OnnxGenerator:
+    """Seq2seq generation with ONNX Runtime through ``optimum``.
+
+    The model is exported to ONNX once and loaded from ``cache_dir`` afterwards.
+    """
+
+    def __init__(self, model_name=QA_MODEL, cache_dir=ONNX_CACHE_DIR):
+        try:
+            from optimum.onnxruntime import ORTModelForSeq2SeqLM
+        except ImportError as e:
+            raise RuntimeError("QA_BACKEND=onnx requires `pip install optimum[onnxruntime]`") from e
+        from transformers import AutoTokenizer
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        export_dir = os.path.join(cache_dir, model_name.replace("/", "--"))
+        if not os.path.isdir(export_dir):
+            logger.info(f"Exporting {model_name} to ONNX in {export_dir}")
+            model = ORTModelForSeq2SeqLM.from_pretrained(model_name, export=True)
+            # Other workers may export at the same time; whoever renames first wins
+            os.makedirs(cache_dir, exist_ok=True)
+            staging_dir = tempfile.mkdtemp(dir=cache_dir)
+            model.save_pretrained(staging_dir)
+            try:
+                os.rename(staging_dir, export_dir)
+            except OSError:
+                shutil.rmtree(staging_dir, ignore_errors=True)
+        self.model = ORTModelForSeq2SeqLM.from_pretrained(export_dir)
+
+    def generate(self, prompts, max_new_tokens):
+        inputs = self.tokenizer(prompts, return_tensors="pt", padding=True)
+        output = self.model.generate(**inputs, max_new_tokens=max_new_tokens)
+        texts = self.tokenizer.batch_decode(output, skip_special_tokens=True)
+        return texts, int((output != self.tokenizer.pad_token_id).sum())
+
+
+class SentenceTransformerEmbedder:
+    """Sentence embeddings with sentence-transformers, on PyTorch (optionally int8) or ONNX Runtime."""
+
+    def __init__(self, model_name=EMBEDDING_MODEL, quantize=False, onnx=False):
+        from sentence_transformers import SentenceTransformer
+
+        if onnx:
+            try:
+                self.model = SentenceTransformer(model_name, device="cpu", backend="onnx")
+            except (ImportError, TypeError) as e:
+                raise RuntimeError(
+                    "EMBEDDING_BACKEND=onnx requires sentence-transformers>=3.2 with optimum[onnxruntime]"
+                ) from e
+        else:
+            torch = _configure_torch()
+            self.model = SentenceTransformer(model_name, device="cpu")
+            if quantize:
+                self.model = _quantize(torch, self.model)
+
+    def encode(self, texts):
+        return self.model.encode(texts, batch_size=32, convert_to_numpy=True)
+
+
+class StubGenerator:
+    """Deterministic stand-in for the QA model, for offline benchmarks.
+
+    Answers with the first words of the prompt's context and sleeps a fixed
+    amount per batch and per prompt, so batching still pays off.
+    """
+
+    def __init__(self, batch_ms=float(os.getenv("STUB_BATCH_MS", "20")),
+                 prompt_ms=float(os.getenv("STUB_PROMPT_MS", "5")), answer_words=8):
+        self.batch_seconds = batch_ms / 1000
+        self.prompt_seconds = prompt_ms / 1000
+        self.answer_words = answer_words
+
+    def generate(self, prompts, max_new_tokens):
+        time.sleep(self.batch_seconds + self.prompt_seconds * len(prompts))
+        texts = []
+        for prompt in prompts:
+            context = prompt.split("Context:", 1)[-1]
+            texts.append(" ".join(context.split()[:min(self.answer_words, max_new_tokens)]))
+        return texts, sum(len(text.split()) for text in texts)
+
+
+class StubEmbedder:
+    """Deterministic hashed bag-of-words embeddings, for offline benchmarks."""
+
+    def __init__(self, dimension=384):
+        self.dimension = dimension
+
+    def encode(self, texts):
+        import numpy as np
+
+        single = isinstance(texts, str)
+        vectors = np.zeros((1 if single else len(texts), self.dimension), dtype="float32")
+        for row, text in enumerate([texts] if single else texts):
+            for word in text.lower().split():
+                digest = hashlib.md5(word.encode("utf-8")).digest()
+                vectors[row, int.from_bytes(digest[:4], "little") % self.dimension] += 1.0
+        return vectors[0] if single else vectors
+
+
+def load_generator(backend=QA_BACKEND):
+    logger.info(f"Loading {QA_MODEL} with the {backend} backend")
+    if backend == "torch":
+        return TorchGenerator()
+    if backend == "torch-int8":
+        return TorchGenerator(quantize=True)
+    if backend == "onnx":
+        return OnnxGenerator()
+    if backend == "stub":
+        return StubGenerator()
+    raise ValueError(f"Unknown QA backend: {backend}")
+
+
+def load_embedder(backend=EMBEDDING_BACKEND):
+    logger.info(f"Loading {EMBEDDING_MODEL} with the {backend} backend")
+    if backend == "torch":
+        return SentenceTransformerEmbedder()
+    if backend == "torch-int8":
+        return SentenceTransformerEmbedder(quantize=True)
+    if backend == "onnx":
+        return SentenceTransformerEmbedder(onnx=True)
+    if backend == "stub":
+        return StubEmbedder()
+    raise ValueError(f"Unknown embedding backend: {backend}")
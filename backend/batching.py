@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import os
+import time
+
+import inference
+
+
+logger = logging.getLogger(__name__)
+
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "10"))
+BATCH_QUEUE_SIZE = int(os.getenv("BATCH_QUEUE_SIZE", "0"))  # 0 means as many prompts as the executor can hold in full batches
+
+
+class BatchStats:
+    def __init__(self):
+        self.batches = 0
+        self.prompts = 0
+        self.max_batch_size = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.generate_seconds = 0.0
+        self.generated_tokens = 0
+        self.failed_batches = 0
+
+    def record(self, batch_size, queue_waits, seconds, tokens):
+        self.batches += 1
+        self.prompts += batch_size
+        self.max_batch_size = max(self.max_batch_size, batch_size)
+        self.queue_wait_total += sum(queue_waits)
+        self.queue_wait_max = max(self.queue_wait_max, *queue_waits)
+        self.generate_seconds += seconds
+        self.generated_tokens += tokens
+
+    def snapshot(self):
+        return {
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "prompts": self.prompts,
+            "mean_batch_size": self.prompts / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "mean_queue_wait_ms": 1000 * self.queue_wait_total / self.prompts if self.prompts else 0.0,
+            "max_queue_wait_ms": 1000 * self.queue_wait_max,
+            "generated_tokens": self.generated_tokens,
+            "tokens_per_second": self.generated_tokens / self.generate_seconds if self.generate_seconds else 0.0,
+        }
+
+
+class _Pending:
+    __slots__ = ("prompt", "future", "enqueued_at")
+
+    def __init__(self, prompt, future):
+        self.prompt = prompt
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+
+
+class BatchScheduler:
+    """Collects prompts from concurrent requests into batched ``generate`` calls.
+
+    A batch is closed after ``max_wait_ms`` or once it holds ``max_batch_size``
+    prompts. While every executor worker is busy, new prompts keep queueing, so
+    batches grow with load and stay small (low latency) when the server is idle.
+    At most ``max_queue`` prompts may wait; beyond that callers get
+    ``InferenceOverloaded`` right away, like the executor itself.
+    """
+
+    def __init__(self, executor, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS,
+                 max_queue=BATCH_QUEUE_SIZE):
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        # The executor bounds tasks, and each task carries up to max_batch_size prompts
+        self.max_queue = max_queue or executor.capacity * max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.stats = BatchStats()
+        self._queue = None
+        self._worker = None
+        self._slots = None
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self):
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.executor.max_workers)
+            self._worker = asyncio.create_task(self._collect())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    async def generate(self, prompt):
+        return (await self.generate_many([prompt]))[0]
+
+    async def generate_many(self, prompts):
+        """Queue all of ``prompts`` or none of them, and wait for their answers in order."""
+        self.start()
+        if self._queue.qsize() + len(prompts) > self.max_queue:
+            raise inference.InferenceOverloaded(self.executor.retry_after)
+        loop = asyncio.get_running_loop()
+        items = [_Pending(prompt, loop.create_future()) for prompt in prompts]
+        for item in items:
+            self._queue.put_nowait(item)
+        return await asyncio.gather(*(item.future for item in items))
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._slots.acquire()
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            # Callers that timed out or disconnected while queued are dropped
+            batch = [item for item in batch if not item.future.done()]
+            if not batch:
+                self._slots.release()
+                continue
+            asyncio.create_task(self._dispatch(batch))
+
+    async def _dispatch(self, batch):
+        dispatched = time.perf_counter()
+        queue_waits = [dispatched - item.enqueued_at for item in batch]
+        try:
+            texts, tokens, seconds = await self.executor.run(inference.generate_batch,
+                                                             [item.prompt for item in batch])
+        except Exception as e:
+            self.stats.failed_batches += 1
+            logger.error(f"Batch of {len(batch)} prompts failed: {e!r}")
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(e)
+        else:
+            self.stats.record(len(batch), queue_waits, seconds, tokens)
+            for item, text in zip(batch, texts):
+                if not item.future.done():
+                    item.future.set_result(text)
+        finally:
+            self._slots.release()
@@ -0,0 +1,182 @@
+"""Offline load test for the Q&A API.
+
+Drives the FastAPI app in-process with synthetic PDFs and the deterministic
+``stub`` model backends, so it needs no model downloads or network and gives
+comparable numbers between runs on the same machine::
+
+    python benchmarks/load_test.py --output results.json
+    python benchmarks/load_test.py --baseline results.json --tolerance 0.25
+
+With ``--baseline`` the run exits non-zero when a p95/p99 latency or a
+throughput figure regresses by more than ``--tolerance``.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORDS = (
+    "planet orbit star galaxy nebula comet asteroid gravity telescope spectrum moon atmosphere "
+    "crater eclipse meteor satellite radiation cosmic solar lunar mission rocket probe signal"
+).split()
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+
+def summarize(latencies, elapsed):
+    return {
+        "requests": len(latencies),
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": 1000 * percentile(latencies, 50),
+        "p95_ms": 1000 * percentile(latencies, 95),
+        "p99_ms": 1000 * percentile(latencies, 99),
+    }
+
+
+def make_pdf(pages, seed):
+    import fitz  # PyMuPDF
+
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for number in range(pages):
+        page = doc.new_page()
+        text = f"Page {number} of synthetic document {seed}. " + " ".join(rng.choice(WORDS) for _ in range(350))
+        page.insert_textbox(fitz.Rect(40, 40, page.rect.width - 40, page.rect.height - 40), text, fontsize=9)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+async def ingest(client, pages, seed):
+    pdf = make_pdf(pages, seed)
+    started = time.perf_counter()
+    response = await client.post(
+        "/upload_pdf", files={"file": (f"synthetic-{pages}.pdf", pdf, "application/pdf")},
+        data={"title": f"synthetic-{pages}"},
+    )
+    response.raise_for_status()
+    job = response.json()
+    while job["status"] not in ("done", "failed"):
+        await asyncio.sleep(0.05)
+        job = (await client.get(f"/upload_status/{job['job_id']}")).json()
+    if job["status"] == "failed":
+        raise RuntimeError(f"Ingestion of {pages} pages failed: {job['error']}")
+    elapsed = time.perf_counter() - started
+    return job["document_id"], {"pages": pages, "seconds": elapsed, "pages_per_second": pages / elapsed}
+
+
+async def ask_many(client, document_id, questions, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def ask(question):
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post("/ask_question", json={"document_id": document_id, "question": question})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(ask(question) for question in questions))
+    return summarize(latencies, time.perf_counter() - started)
+
+
+async def run(args):
+    import httpx
+    import main
+
+    transport = httpx.ASGITransport(app=main.app)
+    results = {"ingest": {}, "ask": {}, "ask_cached": {}}
+    await main.start_scheduler()
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+            for seed, pages in enumerate(args.pages):
+                document_id, ingest_result = await ingest(client, pages, seed)
+                results["ingest"][str(pages)] = ingest_result
+
+                rng = random.Random(seed)
+                questions = [
+                    f"What does question {i} say about {rng.choice(WORDS)} and {rng.choice(WORDS)}?"
+                    for i in range(args.questions)
+                ]
+                results["ask"][str(pages)] = await ask_many(client, document_id, questions, args.concurrency)
+                # Same questions again: served by the answer cache
+                results["ask_cached"][str(pages)] = await ask_many(client, document_id, questions, args.concurrency)
+            results["metrics"] = (await client.get("/inference/stats")).json()
+    finally:
+        await main.shutdown_executor()
+    return results
+
+
+def regressions(results, baseline, tolerance):
+    found = []
+    for scenario in ("ask", "ask_cached"):
+        for size, current in results[scenario].items():
+            previous = baseline.get(scenario, {}).get(size)
+            if previous is None:
+                continue
+            for key in ("p95_ms", "p99_ms"):
+                if current[key] > previous[key] * (1 + tolerance):
+                    found.append(f"{scenario}[{size} pages] {key}: {previous[key]:.1f} -> {current[key]:.1f}")
+            if current["throughput_rps"] < previous["throughput_rps"] * (1 - tolerance):
+                found.append(f"{scenario}[{size} pages] throughput_rps: "
+                             f"{previous['throughput_rps']:.2f} -> {current['throughput_rps']:.2f}")
+    for size, current in results["ingest"].items():
+        previous = baseline.get("ingest", {}).get(size)
+        if previous and current["pages_per_second"] < previous["pages_per_second"] * (1 - tolerance):
+            found.append(f"ingest[{size} pages] pages_per_second: "
+                         f"{previous['pages_per_second']:.1f} -> {current['pages_per_second']:.1f}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[5, 50, 200], help="synthetic PDF sizes")
+    parser.add_argument("--questions", type=int, default=50, help="questions per document")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent in-flight questions")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="results JSON of a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+
+    workdir = tempfile.mkdtemp(prefix="planetai-bench-")
+    # Must be set before the app modules are imported; they read their config at import time
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "UPLOAD_DIR": os.path.join(workdir, "uploads"),
+        "QA_BACKEND": "stub",
+        "EMBEDDING_BACKEND": "stub",
+        "PRELOAD_MODELS": "0",
+    })
+    os.chdir(workdir)  # keeps app.log out of the source tree
+    sys.path.insert(0, BACKEND_DIR)
+
+    results = asyncio.run(run(args))
+    print(json.dumps(results, indent=2))
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if baseline:
+        with open(baseline, encoding="utf-8") as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        sys.exit(1 if found else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import os
+import threading
+from collections import OrderedDict
+
+
+DOCUMENT_CACHE_MB = float(os.getenv("DOCUMENT_CACHE_MB", "256"))
+
+
+class LRUCache:
+    """Thread-safe LRU cache bounded by the total ``nbytes`` of its values.
+
+    Values must expose an ``nbytes`` attribute. A value larger than the whole
+    budget is simply not cached.
+    """
+
+    def __init__(self, max_bytes=int(DOCUMENT_CACHE_MB * 1024 * 1024)):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = value.nbytes
+        with self._lock:
+            self._remove(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = value
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted.nbytes
+
+    def pop(self, key):
+        with self._lock:
+            return self._remove(key)
+
+    def _remove(self, key):
+        value = self._entries.pop(key, None)
+        if value is not None:
+            self.current_bytes -= value.nbytes
+        return value
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,237 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import backends
+from metrics import QUEUE_SECONDS, STAGE_SECONDS
+
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "2000"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "100"))
+MAX_NEW_TOKENS = int(os.getenv("MAX_NEW_TOKENS", "100"))
+
+INFERENCE_EXECUTOR = os.getenv("INFERENCE_EXECUTOR", "thread")  # "thread" or "process"
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "2"))
+INFERENCE_QUEUE_SIZE = int(os.getenv("INFERENCE_QUEUE_SIZE", "16"))
+INFERENCE_TIMEOUT = float(os.getenv("INFERENCE_TIMEOUT", "120"))
+RETRY_AFTER = int(os.getenv("INFERENCE_RETRY_AFTER", "5"))
+
+
+WARMUP = os.getenv("INFERENCE_WARMUP", "1") == "1"
+
+
+# Models live in whichever process runs the tasks below: the API process for
+# the thread pool, or each worker process for the process pool, where every
+# worker pays the full model memory. Each one is loaded on first use, so
+# importing this module stays cheap.
+_models = {}
+_load_lock = threading.Lock()
+
+
+def _load(name):
+    model = _models.get(name)
+    if model is None:
+        with _load_lock:
+            model = _models.get(name)
+            if model is None:
+                model = _LOADERS[name]()
+                _models[name] = model
+                logger.info(f"Loaded {name} in process {os.getpid()}")
+    return model
+
+
+def _load_splitter():
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    return RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, add_start_index=True)
+
+
+_LOADERS = {
+    "splitter": _load_splitter,
+    "embedder": backends.load_embedder,
+    "qa": backends.load_generator,
+}
+
+
+def loaded_models():
+    return sorted(_models)
+
+
+def load_models(warm_up=WARMUP):
+    """Load every model, optionally running one tiny request through each so the first real one is not slow."""
+    for name in _LOADERS:
+        _load(name)
+    if warm_up:
+        embed("warm-up")
+        generate_batch(["Question: warm-up\nContext: warm-up"])
+    return loaded_models()
+
+
+def split_text(pdf_text, final=True):
+    """Split ``pdf_text`` into chunks.
+
+    Returns ``(text_chunks, start_offsets, carry_start)``. When ``final`` is
+    false more text will follow, so the last (possibly cut off) chunk is held
+    back and ``carry_start`` tells the caller where the text to prepend to the
+    next call begins.
+    """
+    pieces = _load("splitter").create_documents([pdf_text]) if pdf_text.strip() else []
+    carry_start = len(pdf_text)
+    if not final and pieces:
+        carry_start = pieces.pop().metadata["start_index"]
+    text_chunks = [piece.page_content for piece in pieces]
+    start_offsets = [piece.metadata["start_index"] for piece in pieces]
+    return text_chunks, start_offsets, carry_start
+
+
+def embed(text):
+    """Embed a string, or a list of strings as one batch."""
+    return _load("embedder").encode(text)
+
+
+def generate_batch(prompts):
+    """Run one batched generate over ``prompts``.
+
+    Returns the texts, the number of generated tokens and the seconds spent
+    generating, which excludes any time the task waited for a worker.
+    """
+    generator = _load("qa")
+    started = time.perf_counter()
+    texts, tokens = generator.generate(prompts, MAX_NEW_TOKENS)
+    return texts, tokens, time.perf_counter() - started
+
+
+# Pipeline stage each task function is reported under on /metrics
+STAGES = {"split_text": "split", "embed": "embed", "generate_batch": "generate", "load_models": "load"}
+
+
+def _timed_call(fn, submitted_at, *args):
+    # Runs in the worker; wall-clock time is comparable across processes
+    started = time.time()
+    result = fn(*args)
+    return result, started - submitted_at, time.time() - started
+
+
+class InferenceOverloaded(Exception):
+    def __init__(self, retry_after):
+        super().__init__("Inference queue is full")
+        self.retry_after = retry_after
+
+
+class InferenceTimeout(Exception):
+    pass
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+class InferenceExecutor:
+    """Bounded worker pool that keeps blocking model work off the event loop.
+
+    At most ``max_workers`` tasks run at once and at most ``max_queue`` more
+    wait for a worker; anything beyond that is rejected immediately so the
+    caller can answer 503 instead of piling up latency.
+    """
+
+    def __init__(self, kind=INFERENCE_EXECUTOR, max_workers=INFERENCE_WORKERS,
+                 max_queue=INFERENCE_QUEUE_SIZE, timeout=INFERENCE_TIMEOUT, retry_after=RETRY_AFTER):
+        if kind == "process":
+            self._pool = ProcessPoolExecutor(max_workers=max_workers)
+        elif kind == "thread":
+            self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+        else:
+            raise ValueError(f"Unknown inference executor: {kind}")
+        self.kind = kind
+        self.max_workers = max_workers
+        self.capacity = max_workers + max_queue
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def _release(self, _future):
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, fn, *args, request=None, timeout=None):
+        """Run ``fn(*args)`` on the pool and await its result.
+
+        Raises ``InferenceOverloaded`` when the queue is full, and otherwise
+        behaves like ``guard``. Tasks that have not started yet are cancelled
+        when we stop waiting for them.
+        """
+        with self._lock:
+            if self._pending >= self.capacity:
+                raise InferenceOverloaded(self.retry_after)
+            self._pending += 1
+        try:
+            future = self._pool.submit(_timed_call, fn, time.time(), *args)
+        except BaseException:
+            self._release(None)
+            raise
+        # The slot is freed when the work itself finishes, not when we stop waiting
+        future.add_done_callback(self._release)
+
+        try:
+            result, queued, elapsed = await guard(asyncio.wrap_future(future), request, timeout or self.timeout)
+        except (InferenceTimeout, ClientDisconnected, asyncio.CancelledError):
+            future.cancel()
+            raise
+        QUEUE_SECONDS.observe(queued)
+        STAGE_SECONDS.observe(elapsed, stage=STAGES.get(fn.__name__, fn.__name__))
+        return result
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def guard(awaitable, request=None, timeout=INFERENCE_TIMEOUT):
+    """Await ``awaitable``, giving up after ``timeout`` seconds or when ``request``'s client disconnects.
+
+    The awaitable is cancelled when we give up on it.
+    """
+    result = asyncio.ensure_future(awaitable)
+    watcher = asyncio.ensure_future(_wait_for_disconnect(request)) if request is not None else None
+    waiters = {result, watcher} if watcher else {result}
+    try:
+        done, _ = await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        _abandon(result)
+        raise
+    finally:
+        if watcher:
+            watcher.cancel()
+
+    if result in done:
+        return result.result()
+    _abandon(result)
+    if watcher in done:
+        raise ClientDisconnected()
+    raise InferenceTimeout()
+
+
+def _abandon(future):
+    future.cancel()
+    # Nobody awaits it any more; retrieve its outcome so asyncio does not log
+    # "exception was never retrieved" (e.g. for a cancelled gather)
+    future.add_done_callback(_consume_result)
+
+
+def _consume_result(future):
+    if not future.cancelled():
+        future.exception()
+
+
+async def _wait_for_disconnect(request, interval=0.25):
+    while not await request.is_disconnected():
+        await asyncio.sleep(interval)
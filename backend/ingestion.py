@@ -0,0 +1,321 @@
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import inference
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import insert
+from database import SessionLocal
+from inference import InferenceOverloaded
+from models import Chunk, ChunkContent, Document, IngestionJob
+from vector_index import encode_embedding
+from metrics import STAGE_SECONDS, span
+
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./uploads")
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 1)))
+PAGES_PER_TASK = int(os.getenv("PAGES_PER_TASK", "8"))
+INGESTION_CONCURRENCY = int(os.getenv("INGESTION_CONCURRENCY", "2"))
+INGESTION_HEARTBEAT_SECONDS = float(os.getenv("INGESTION_HEARTBEAT_SECONDS", "30"))
+# A queued or processing job not updated for this long lost its process (crash, kill, restart)
+INGESTION_STALE_SECONDS = float(os.getenv("INGESTION_STALE_SECONDS", "300"))
+
+ACTIVE_STATUSES = ("queued", "processing")
+
+
+def stale_before():
+    """Active jobs last updated before this time are abandoned."""
+    return datetime.now(timezone.utc) - timedelta(seconds=INGESTION_STALE_SECONDS)
+
+
+def count_pages(path):
+    import fitz  # PyMuPDF
+
+    with fitz.open(path) as doc:
+        return doc.page_count
+
+
+def extract_pages(path, start, end):
+    """Extract the text of pages ``start`` to ``end`` (exclusive); runs in a worker process.
+
+    Returns the text and the seconds spent extracting it.
+    """
+    import fitz  # PyMuPDF
+
+    started = time.perf_counter()
+    with fitz.open(path) as doc:
+        text = "".join(doc[number].get_text() for number in range(start, end))
+    return text, time.perf_counter() - started
+
+
+def chunk_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _known_hashes(db, hashes):
+    known = set()
+    for i in range(0, len(hashes), 500):  # stay well under SQLite's bound-parameter limit
+        batch = hashes[i:i + 500]
+        known.update(h for (h,) in db.query(ChunkContent.content_hash).filter(ChunkContent.content_hash.in_(batch)))
+    return known
+
+
+def _insert_ignoring_duplicates(db, table):
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect in ("mysql", "mariadb"):
+        return insert(table).prefix_with("IGNORE")
+    else:
+        raise RuntimeError(f"Chunk deduplication does not support the {dialect} database")
+    return dialect_insert(table).on_conflict_do_nothing()
+
+
+def _add_chunks(db, document_id, first_position, text_chunks, start_offsets, hashes, contents, base_offset):
+    if contents:
+        # Another job may store the same chunk concurrently; the first one wins
+        db.execute(_insert_ignoring_duplicates(db, ChunkContent), contents)
+    db.add_all([
+        Chunk(
+            document_id=document_id,
+            position=first_position + i,
+            start_offset=base_offset + start,
+            end_offset=base_offset + start + len(text),
+            content_hash=h,
+        )
+        for i, (text, start, h) in enumerate(zip(text_chunks, start_offsets, hashes))
+    ])
+
+
+async def store_chunks(db, document_id, first_position, text_chunks, start_offsets, embed, base_offset=0):
+    """Add ``Chunk`` rows for a document, embedding only chunk texts not stored yet.
+
+    ``embed`` is an async callable mapping a list of texts to their embeddings.
+    Database work runs on the thread pool. Returns the number of chunks whose
+    embedding was reused.
+    """
+    hashes = [chunk_hash(text) for text in text_chunks]
+    unique = dict(zip(hashes, text_chunks))
+    known = await run_in_threadpool(_known_hashes, db, list(unique))
+
+    new = {h: text for h, text in unique.items() if h not in known}
+    contents = []
+    if new:
+        embeddings = await embed(list(new.values()))
+        contents = [
+            {"content_hash": h, "text": text, "embedding": encode_embedding(embedding)}
+            for (h, text), embedding in zip(new.items(), embeddings)
+        ]
+    await run_in_threadpool(_add_chunks, db, document_id, first_position, text_chunks, start_offsets,
+                            hashes, contents, base_offset)
+    return len(hashes) - len(new)
+
+
+def spool_upload(upload_file):
+    """Copy an upload to ``UPLOAD_DIR`` in fixed-size blocks; returns the path and its sha256."""
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+    fd, path = tempfile.mkstemp(suffix=".pdf", dir=UPLOAD_DIR)
+    with os.fdopen(fd, "wb") as out:
+        for block in iter(lambda: upload_file.read(1024 * 1024), b""):
+            digest.update(block)
+            out.write(block)
+    return path, digest.hexdigest()
+
+
+class IngestionPipeline:
+    """Background PDF ingestion: pages -> chunks -> embeddings -> SQLite.
+
+    Page ranges are extracted in parallel on a process pool, but consumed in
+    order with at most two ranges per worker in flight, so memory stays at a
+    few pages regardless of the file size. Progress is written to the
+    ``ingestion_jobs`` table, which every API worker can read.
+    """
+
+    def __init__(self, executor, on_indexed=None, workers=PDF_WORKERS,
+                 pages_per_task=PAGES_PER_TASK, concurrency=INGESTION_CONCURRENCY):
+        self.executor = executor
+        self.on_indexed = on_indexed
+        self.workers = workers
+        self.pages_per_task = pages_per_task
+        self._pool = None
+        self._jobs = asyncio.Semaphore(concurrency)
+        self._owned = set()  # ids of jobs this process has queued or is running
+        self.active_jobs = 0
+
+    def create_job(self, db, title, pages_total, content_hash=None):
+        job = IngestionJob(id=uuid.uuid4().hex, title=title, content_hash=content_hash,
+                           status="queued", pages_total=pages_total)
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        self._owned.add(job.id)
+        return job
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    async def run(self, job_id, path):
+        async with self._jobs:
+            self.active_jobs += 1
+            db = SessionLocal()
+            try:
+                await self._ingest(db, job_id, path)
+            except Exception as e:
+                logger.exception(f"Ingestion job {job_id} failed")
+                await run_in_threadpool(self._fail, db, job_id, str(e) or e.__class__.__name__)
+            except BaseException:
+                # Cancelled, e.g. by shutdown(); clean up right away since awaiting may no longer work
+                logger.warning(f"Ingestion job {job_id} was cancelled")
+                self._fail(db, job_id, "Ingestion was cancelled, please upload the file again.")
+                raise
+            finally:
+                self.active_jobs -= 1
+                self._owned.discard(job_id)
+                db.close()
+                os.remove(path)
+
+    async def maintain(self):
+        """Keep this process's jobs fresh and fail jobs whose process is gone; runs until cancelled."""
+        while True:
+            try:
+                await run_in_threadpool(self._heartbeat)
+            except Exception:
+                logger.exception("Ingestion job heartbeat failed")
+            await asyncio.sleep(INGESTION_HEARTBEAT_SECONDS)
+
+    def _heartbeat(self):
+        db = SessionLocal()
+        try:
+            if self._owned:
+                db.query(IngestionJob).filter(
+                    IngestionJob.id.in_(list(self._owned)), IngestionJob.status.in_(ACTIVE_STATUSES)
+                ).update({IngestionJob.updated_at: datetime.now(timezone.utc)}, synchronize_session=False)
+                db.commit()
+            stale = db.query(IngestionJob.id).filter(
+                IngestionJob.status.in_(ACTIVE_STATUSES), IngestionJob.updated_at < stale_before()
+            ).all()
+            for (job_id,) in stale:
+                logger.warning(f"Ingestion job {job_id} was abandoned, marking it failed")
+                self._fail(db, job_id, "Ingestion was interrupted, please upload the file again.")
+        finally:
+            db.close()
+
+    async def _ingest(self, db, job_id, path):
+        # Blocking SQLite work goes through the thread pool; job and document
+        # attributes are only touched there, since a commit expires them.
+        document_id, pages_total = await run_in_threadpool(self._start, db, job_id)
+
+        carry, carry_offset, position, reused = "", 0, 0, 0
+        # Extracted text is spooled to disk so the full text is only read back once at the end
+        with tempfile.TemporaryFile("w+", encoding="utf-8", dir=UPLOAD_DIR) as text_spool:
+            async for end, page_text in self._extract(path, pages_total):
+                text_spool.write(page_text)
+                buffer = carry + page_text
+                final = end == pages_total
+                text_chunks, start_offsets, carry_start = await self._run(inference.split_text, buffer, final)
+
+                reused += await store_chunks(db, document_id, position, text_chunks, start_offsets,
+                                             self._embed, carry_offset)
+                position += len(text_chunks)
+                carry, carry_offset = buffer[carry_start:], carry_offset + carry_start
+                await run_in_threadpool(self._progress, db, job_id, end, position)
+
+            if position == 0:
+                raise ValueError("No text found in the PDF document.")
+            await run_in_threadpool(self._finish, db, job_id, document_id, text_spool)
+
+        logger.info(f"Ingestion job {job_id} indexed document {document_id} into {position} chunks "
+                    f"({reused} embeddings reused)")
+        if self.on_indexed is not None:
+            self.on_indexed(document_id)
+
+    def _start(self, db, job_id):
+        job = db.get(IngestionJob, job_id)
+        job.status = "processing"
+        # The document stays hidden until _finish sets its text
+        document = Document(title=job.title, content_hash=job.content_hash)
+        db.add(document)
+        db.flush()
+        job.document_id = document.id
+        db.commit()
+        return job.document_id, job.pages_total
+
+    def _progress(self, db, job_id, pages_done, chunks_done):
+        job = db.get(IngestionJob, job_id)
+        job.pages_done = pages_done
+        job.chunks_done = chunks_done
+        with span("persist"):
+            db.commit()
+
+    def _finish(self, db, job_id, document_id, text_spool):
+        text_spool.seek(0)
+        db.get(Document, document_id).text = text_spool.read()
+        db.get(IngestionJob, job_id).status = "done"
+        db.commit()
+
+    async def _extract(self, path, page_count):
+        """Yield ``(end_page, text)`` for consecutive page ranges, in page order."""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        loop = asyncio.get_running_loop()
+        ranges = iter(
+            (start, min(start + self.pages_per_task, page_count))
+            for start in range(0, page_count, self.pages_per_task)
+        )
+        in_flight = deque()
+
+        def submit_next():
+            page_range = next(ranges, None)
+            if page_range is not None:
+                future = loop.run_in_executor(self._pool, extract_pages, path, *page_range)
+                in_flight.append((page_range[1], future))
+
+        for _ in range(2 * self.workers):
+            submit_next()
+        try:
+            while in_flight:
+                end, future = in_flight.popleft()
+                text, seconds = await future
+                STAGE_SECONDS.observe(seconds, stage="extract")
+                submit_next()
+                yield end, text
+        finally:
+            for _, future in in_flight:
+                future.cancel()
+
+    async def _run(self, fn, *args):
+        # Background work waits for capacity instead of failing like interactive requests
+        while True:
+            try:
+                return await self.executor.run(fn, *args)
+            except InferenceOverloaded as e:
+                await asyncio.sleep(e.retry_after)
+
+    async def _embed(self, texts):
+        return await self._run(inference.embed, texts)
+
+    def _fail(self, db, job_id, error):
+        db.rollback()
+        job = db.get(IngestionJob, job_id)
+        if job is None or job.status not in ACTIVE_STATUSES:
+            return
+        if job.document_id is not None:
+            db.query(Chunk).filter(Chunk.document_id == job.document_id).delete()
+            db.query(Document).filter(Document.id == job.document_id).delete()
+            job.document_id = None
+        job.status = "failed"
+        job.error = error
+        db.commit()
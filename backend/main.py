@@ -1,17 +1,29 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, Form
+import asyncio
+import json
+import os
+from typing import Literal
+from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, Form, Request, BackgroundTasks, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
-import fitz  # PyMuPDF
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from transformers import pipeline
-from sentence_transformers import SentenceTransformer
 import logging
-from sqlalchemy.orm import Session
-from database import engine, get_db
-from models import Document, QuestionAnswer
+from sqlalchemy import func, inspect, text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.orm import Session, selectinload
+from database import engine, get_db, SessionLocal
+from models import Document, QuestionAnswer, Chunk, ChunkContent, IngestionJob
+from vector_index import VectorIndex
+from document_cache import LRUCache
+from answer_cache import AnswerCache
+import inference
+from inference import InferenceExecutor, InferenceOverloaded, InferenceTimeout, ClientDisconnected
+from batching import BatchScheduler
+import ingestion
+from ingestion import IngestionPipeline, store_chunks
+from metrics import REGISTRY, Gauge, RequestMetricsMiddleware, span
 
 
-Document.metadata.create_all(bind=engine)
 
 
 logging.basicConfig(
@@ -26,6 +38,56 @@ logging.basicConfig(
 logger = logging.getLogger(__name__) 
 
 
+def already_done(e):
+    # Another worker migrating at the same time got there first
+    message = str(e.orig).lower()
+    return "already exists" in message or "duplicate column" in message
+
+
+def run_ddl(statement):
+    try:
+        statement()
+    except (OperationalError, ProgrammingError) as e:
+        if not already_done(e):
+            raise
+
+
+def migrate_schema():
+    """Bring an existing database up to the models; safe to run from several workers at once."""
+    tables = set(inspect(engine).get_table_names())
+    if "chunks" in tables and "content_hash" not in {c["name"] for c in inspect(engine).get_columns("chunks")}:
+        # Chunks used to hold their own text and embedding; they are rebuilt
+        # from documents.text the first time each document is asked about
+        logger.info("Dropping chunks table with the old schema")
+        Chunk.__table__.drop(bind=engine, checkfirst=True)
+        tables.discard("chunks")
+
+    run_ddl(lambda: Document.metadata.create_all(bind=engine))
+
+    # create_all skips tables that already exist, so add columns and indexes
+    # introduced since the table was created. New columns are nullable.
+    inspector = inspect(engine)
+    for table in Document.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                logger.info(f"Adding column {table.name}.{column.name}")
+                column_type = column.type.compile(dialect=engine.dialect)
+                run_ddl(lambda: execute(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+    for table in Document.metadata.sorted_tables:
+        for table_index in table.indexes:
+            run_ddl(lambda: table_index.create(bind=engine, checkfirst=True))
+
+
+def execute(statement):
+    with engine.begin() as connection:
+        connection.execute(text(statement))
+
+migrate_schema()
+
+
 app = FastAPI()
 
 
@@ -41,12 +103,99 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 
-documents = {}
+app.add_middleware(RequestMetricsMiddleware)
+
+
+TOP_K = int(os.getenv("TOP_K", "3"))
+PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "1") == "1"
+MODEL_LOAD_TIMEOUT = float(os.getenv("MODEL_LOAD_TIMEOUT", "1800"))
+MODEL_LOAD_RETRY_SECONDS = float(os.getenv("MODEL_LOAD_RETRY_SECONDS", "10"))
+MODEL_LOAD_RETRY_MAX_SECONDS = float(os.getenv("MODEL_LOAD_RETRY_MAX_SECONDS", "600"))
+DOCUMENTS_YIELD_PER = int(os.getenv("DOCUMENTS_YIELD_PER", "10"))
+
+# Hot documents only; everything else is rehydrated from the chunks table on demand
+document_cache = LRUCache()
+answer_cache = AnswerCache()
 last_document_id = None  
 
+executor = InferenceExecutor()
+# Models load lazily; with PRELOAD_MODELS they load in the background after startup
+models_ready = not PRELOAD_MODELS
+model_load_error = None
+scheduler = BatchScheduler(executor)
+
+
+def on_document_indexed(document_id):
+    global last_document_id
+    last_document_id = document_id
+    document_cache.pop(document_id)
+    answer_cache.invalidate(document_id)
+
+
+pipeline = IngestionPipeline(executor, on_indexed=on_document_indexed)
+
+for gauge in (
+    Gauge("planetai_batch_queue_depth", "Prompts waiting to be batched.", lambda: scheduler.queue_depth),
+    Gauge("planetai_executor_pending", "Inference tasks running or queued on the executor.", lambda: executor.pending),
+    Gauge("planetai_ingestion_active_jobs", "Ingestion jobs currently running.", lambda: pipeline.active_jobs),
+    Gauge("planetai_generated_tokens_per_second", "Generation throughput since startup.",
+          lambda: scheduler.stats.snapshot()["tokens_per_second"]),
+    Gauge("planetai_document_cache_bytes", "Bytes held by the document index cache.",
+          lambda: document_cache.current_bytes),
+    Gauge("planetai_answer_cache_hit_rate", "Share of questions answered from the answer cache.",
+          lambda: answer_cache.stats()["hit_rate"]),
+):
+    REGISTRY.register(gauge)
+
+
+async def preload_models():
+    global models_ready, model_load_error
+    # Thread workers share one copy of the models; process workers each load their own
+    runs = 1 if executor.kind == "thread" else executor.max_workers
+    delay = MODEL_LOAD_RETRY_SECONDS
+    while True:
+        try:
+            await asyncio.gather(*(
+                executor.run(inference.load_models, timeout=MODEL_LOAD_TIMEOUT) for _ in range(runs)
+            ))
+        except Exception as e:
+            # Reported on /ready until a later attempt succeeds
+            model_load_error = f"{e.__class__.__name__}: {e}"
+            logger.exception(f"Failed to preload inference models, retrying in {delay:.0f}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MODEL_LOAD_RETRY_MAX_SECONDS)
+        else:
+            models_ready = True
+            model_load_error = None
+            logger.info("Inference models loaded")
+            return
+
+
+# Held so they are not garbage collected while running, and cancelled on shutdown
+startup_tasks = []
+
+
+@app.on_event("startup")
+async def start_scheduler():
+    scheduler.start()
+    # Also fails jobs left queued or processing by a process that died
+    startup_tasks.append(asyncio.create_task(pipeline.maintain()))
+    if PRELOAD_MODELS:
+        startup_tasks.append(asyncio.create_task(preload_models()))
+
+
+@app.on_event("shutdown")
+async def shutdown_executor():
+    for task in startup_tasks:
+        task.cancel()
+    await scheduler.stop()
+    pipeline.shutdown()
+    executor.shutdown()
+
 class QuestionRequest(BaseModel):
     document_id: int = None  
     question: str
@@ -55,116 +204,394 @@ class QuestionsAndAnswersResponse(BaseModel):
     question: str
     answer: str
 
-@app.post("/upload_pdf")
-async def upload_pdf(file: UploadFile = File(...), title: str = Form(...),db: Session = Depends(get_db)):
-    global last_document_id  
-    pdf_text = ""
-    logger.info(f"Received title: {title}")
+
+def inference_error(e):
+    if isinstance(e, InferenceOverloaded):
+        logger.warning("Inference queue full, rejecting request")
+        return HTTPException(status_code=503, detail="Server is busy, please retry later.",
+                             headers={"Retry-After": str(e.retry_after)})
+    if isinstance(e, InferenceTimeout):
+        logger.error("Inference timed out")
+        return HTTPException(status_code=504, detail="The model took too long to respond.")
+    logger.info("Client disconnected before inference finished")
+    return HTTPException(status_code=499, detail="Client closed request.")
+
+
+async def build_index(db, document_id, pdf_text, request=None):
+    # Chunk and embed once per document; questions only search this index
+    text_chunks, start_offsets, _ = await executor.run(inference.split_text, pdf_text, request=request)
+
+    async def embed(texts):
+        return await executor.run(inference.embed, texts, request=request)
+
+    await run_in_threadpool(delete_chunks, db, document_id)
+    await store_chunks(db, document_id, 0, text_chunks, start_offsets, embed)
+    await run_in_threadpool(db.commit)
+    index = await run_in_threadpool(load_index, db, document_id) or VectorIndex([], [])
+    document_cache.put(document_id, index)
+    # Answers stored so far were generated from the old chunks
+    last_answer_id = await run_in_threadpool(last_stored_answer_id, db, document_id)
+    answer_cache.invalidate(document_id, valid_after=last_answer_id or 0)
+    logger.info(f"Indexed document {document_id} into {len(index)} chunks")
+    return index
+
+
+def delete_chunks(db, document_id):
+    db.query(Chunk).filter(Chunk.document_id == document_id).delete()
+
+
+def last_stored_answer_id(db, document_id):
+    return db.query(func.max(QuestionAnswer.id)).filter(QuestionAnswer.document_id == document_id).scalar()
+
+
+def load_index(db, document_id):
+    rows = (
+        db.query(ChunkContent.text, ChunkContent.embedding)
+        .join(Chunk, Chunk.content_hash == ChunkContent.content_hash)
+        .filter(Chunk.document_id == document_id)
+        .order_by(Chunk.position)
+        .all()
+    )
+    return VectorIndex.from_rows(rows) if rows else None
+
+
+# document_id -> task loading its index, so concurrent misses share one load
+index_loads = {}
+
+
+async def get_index(document_id):
+    index = document_cache.get(document_id)
+    if index is not None:
+        return index
+
+    loading = index_loads.get(document_id)
+    if loading is None:
+        loading = asyncio.ensure_future(load_or_build_index(document_id))
+        index_loads[document_id] = loading
+        loading.add_done_callback(lambda task: index_loads.pop(document_id, None))
+    # One waiter giving up must not cancel the load the others are waiting on
+    return await asyncio.shield(loading)
+
+
+async def load_or_build_index(document_id):
+    # Uses its own session: the request that started the load may finish first
+    db = SessionLocal()
     try:
-        pdf_content = await file.read()  
-        logger.info(f"Uploaded file size: {len(pdf_content)} bytes")
+        # Chunks of a document still being ingested must not be served as its index
+        if not await run_in_threadpool(document_exists, db, document_id):
+            return None
+        index = await run_in_threadpool(load_index, db, document_id)
+        if index is None:
+            # Documents stored before chunks were persisted are indexed on first use
+            pdf_text = await run_in_threadpool(document_text, db, document_id)
+            return await build_index(db, document_id, pdf_text) if pdf_text else None
+
+        document_cache.put(document_id, index)
+        return index
+    finally:
+        db.close()
+
+
+def load_stored_answers(db, document_id):
+    return (
+        db.query(QuestionAnswer.question, QuestionAnswer.answer)
+        .filter(QuestionAnswer.document_id == document_id,
+                QuestionAnswer.id > answer_cache.valid_after(document_id))
+        .order_by(QuestionAnswer.id.desc())
+        .limit(answer_cache.max_entries)
+        .all()
+    )
 
-        with fitz.open(stream=pdf_content, filetype="pdf") as doc:
-            for page in doc:
-                pdf_text += page.get_text()
 
-        logger.info(f"Extracted text length: {len(pdf_text)} characters")
+# Ingestion sets a document's text last; until then the document is not finished
+FINISHED = Document.text.isnot(None)
 
+
+def document_exists(db, document_id):
+    return db.query(Document.id).filter(Document.id == document_id, FINISHED).first() is not None
+
+
+def document_text(db, document_id):
+    return db.query(Document.text).filter(Document.id == document_id).scalar()
+
+
+def latest_document_id(db):
+    return db.query(func.max(Document.id)).filter(FINISHED).scalar()
+
+
+def document_not_found(db, document_id):
+    available_ids = [doc_id for (doc_id,) in db.query(Document.id).filter(FINISHED).order_by(Document.id)]
+    logger.error(f"Document with ID {document_id} not found. Available IDs: {available_ids}")
+    return HTTPException(status_code=404, detail=f"Document not found. Available document IDs: {available_ids}")
+
+
+def save_answer(db, document_id, question, answer):
+    with span("persist"):
+        qa_entry = QuestionAnswer(document_id=document_id, question=question, answer=answer)
+        db.add(qa_entry)
+        db.commit()
+        db.refresh(qa_entry)
+    return qa_entry
+
+
+def find_duplicate(db, content_hash):
+    """Return the finished document or the running ingestion job with the same PDF bytes, if any."""
+    duplicate = db.query(Document.id).filter(Document.content_hash == content_hash, FINISHED).first()
+    # A job nobody has updated for a while was abandoned; it must not swallow new uploads
+    running = None if duplicate else db.query(IngestionJob).filter(
+        IngestionJob.content_hash == content_hash, IngestionJob.status.in_(ingestion.ACTIVE_STATUSES),
+        IngestionJob.updated_at >= ingestion.stale_before(),
+    ).first()
+    return duplicate, running
+
+@app.post("/upload_pdf", status_code=202)
+async def upload_pdf(background_tasks: BackgroundTasks, file: UploadFile = File(...), title: str = Form(...),db: Session = Depends(get_db)):
+    logger.info(f"Received title: {title}")
+    path, content_hash = await run_in_threadpool(ingestion.spool_upload, file.file)
+
+    # Identical bytes were uploaded before: reuse that document or its running job
+    duplicate, running = await run_in_threadpool(find_duplicate, db, content_hash)
+    if duplicate or running:
+        os.remove(path)
+        if duplicate:
+            logger.info(f"Upload matches existing document {duplicate.id}")
+            return {"job_id": None, "status": "done", "document_id": duplicate.id, "duplicate": True}
+        logger.info(f"Upload matches running ingestion job {running.id}")
+        return {"job_id": running.id, "status": running.status, "status_url": f"/upload_status/{running.id}",
+                "duplicate": True}
+
+    try:
+        logger.info(f"Uploaded file size: {os.path.getsize(path)} bytes")
+        page_count = await run_in_threadpool(ingestion.count_pages, path)
     except Exception as e:
+        os.remove(path)
         logger.error(f"Error reading PDF: {e}")
         raise HTTPException(status_code=400, detail="Failed to read the PDF document.")
 
-    if pdf_text:
-      
-        document = Document(title=title if title else "Untitled Document", text=pdf_text)
-        db.add(document)
-        db.commit()
-        db.refresh(document)
-       
-        last_document_id = document.id
-        documents[last_document_id] = pdf_text
-        logger.info(f"Document uploaded with ID: {last_document_id}")
-        return {"document_id": last_document_id}
-    else:
-        logger.warning("No text extracted from PDF.")
+    if not page_count:
+        os.remove(path)
+        logger.warning("PDF has no pages.")
         raise HTTPException(status_code=400, detail="No text found in the PDF document.")
 
-qa_pipeline = pipeline("text2text-generation", model="google/flan-t5-large")
-rerank_model = SentenceTransformer('all-MiniLM-L6-v2')  
+    # Extraction, chunking and embedding continue after the response is sent
+    job = await run_in_threadpool(pipeline.create_job, db, title if title else "Untitled Document",
+                                  page_count, content_hash)
+    background_tasks.add_task(pipeline.run, job.id, path)
+    logger.info(f"Queued ingestion job {job.id} for {page_count} pages")
+    return {"job_id": job.id, "status": job.status, "status_url": f"/upload_status/{job.id}"}
+
+
+@app.get("/upload_status/{job_id}")
+def get_upload_status(job_id: str, db: Session = Depends(get_db)):
+    job = db.get(IngestionJob, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Upload job not found.")
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "title": job.title,
+        "pages_total": job.pages_total,
+        "pages_done": job.pages_done,
+        "chunks_done": job.chunks_done,
+        "progress": job.pages_done / job.pages_total if job.pages_total else 0.0,
+        "document_id": job.document_id if job.status == "done" else None,
+        "error": job.error,
+    }
 
 @app.post("/ask_question")
-async def ask_question(request: QuestionRequest, db: Session = Depends(get_db)):
+async def ask_question(request: QuestionRequest, http_request: Request, db: Session = Depends(get_db)):
     global last_document_id
 
-    doc_id = request.document_id or last_document_id
+    # Other workers may have uploaded since; fall back to the newest stored document
+    doc_id = request.document_id or last_document_id or await run_in_threadpool(latest_document_id, db)
     logger.debug(f"Received request with document_id: {doc_id} and question: {request.question}")
 
-    if not doc_id or doc_id not in documents:
-        available_ids = list(documents.keys())
-        logger.error(f"Document with ID {doc_id} not found. Available IDs: {available_ids}")
-        raise HTTPException(status_code=404, detail=f"Document not found. Available document IDs: {available_ids}")
+    if doc_id and not answer_cache.is_loaded(doc_id):
+        # Only seed for real documents, so unknown ids cannot grow the cache
+        if not await run_in_threadpool(document_exists, db, doc_id):
+            raise await run_in_threadpool(document_not_found, db, doc_id)
+        # Newest answers last so they win over older answers to the same question
+        stored = await run_in_threadpool(load_stored_answers, db, doc_id)
+        answer_cache.load(doc_id, reversed(stored))
+    cached_answer = answer_cache.get_exact(doc_id, request.question) if doc_id else None
+    if cached_answer is not None:
+        logger.info(f"Exact answer cache hit for document {doc_id}")
+        await run_in_threadpool(save_answer, db, doc_id, request.question, cached_answer)
+        return {"answer": cached_answer}
 
-    pdf_text = documents[doc_id]
+    try:
+        index = await get_index(doc_id) if doc_id else None
+    except (InferenceOverloaded, InferenceTimeout, ClientDisconnected) as e:
+        raise inference_error(e)
+    if index is None:
+        raise await run_in_threadpool(document_not_found, db, doc_id)
+
+    if not len(index):
+        logger.error("No chunks created from PDF text.")
+        raise HTTPException(status_code=500, detail="No text chunks created from the document.")
 
     try:
-        # Split the text into chunks as needed
-        splitter = RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=100)
-        text_chunks = splitter.split_text(pdf_text)
+        # Retrieve the most relevant chunks instead of generating over the whole document
+        query_embedding = await executor.run(inference.embed, request.question, request=http_request)
+
+        cached_answer = answer_cache.get_similar(doc_id, query_embedding)
+        if cached_answer is not None:
+            logger.info(f"Semantic answer cache hit for document {doc_id}")
+            await run_in_threadpool(save_answer, db, doc_id, request.question, cached_answer)
+            return {"answer": cached_answer}
 
-        if not text_chunks:
-            logger.error("No chunks created from PDF text.")
-            raise HTTPException(status_code=500, detail="No text chunks created from the document.")
+        with span("retrieve"):
+            hits = index.search(query_embedding, TOP_K)
+        text_chunks = [index.chunks[i] for i, _ in sorted(hits)]
 
         # Use the larger model to get a detailed answer
-        answer_texts = []
-        for chunk in text_chunks:
-            result = qa_pipeline(f"Question: {request.question}\nContext: {chunk}",max_new_tokens=100)
-            answer_texts.append(result[0]["generated_text"])  # Store generated answers from each chunk
+        # Prompts are batched with those of other in-flight questions
+        prompts = [f"Question: {request.question}\nContext: {chunk}" for chunk in text_chunks]
+        answer_texts = await inference.guard(scheduler.generate_many(prompts), http_request, executor.timeout)
 
         # Combine results and potentially rerank or summarize if needed
         final_answer = " ".join(answer_texts)  # Optionally, further process to select the best responses
 
         # Save the QA pair in the database
-        qa_entry = QuestionAnswer(document_id=doc_id, question=request.question, answer=final_answer)
-        db.add(qa_entry)
-        db.commit()
-        db.refresh(qa_entry)
+        await run_in_threadpool(save_answer, db, doc_id, request.question, final_answer)
+        answer_cache.put(doc_id, request.question, final_answer, query_embedding)
 
         return {"answer": final_answer}
 
+    except (InferenceOverloaded, InferenceTimeout, ClientDisconnected) as e:
+        raise inference_error(e)
     except Exception as e:
         logger.exception("Error during question processing")
         raise HTTPException(status_code=500, detail="An error occurred while processing the question.")
 
 
 @app.get("/document/{document_id}/questions", response_model=list[QuestionsAndAnswersResponse])
-def get_questions_answers(document_id: int, db: Session = Depends(get_db)):
-    questions_answers = db.query(QuestionAnswer).filter(QuestionAnswer.document_id == document_id).all()
-
-    if not questions_answers:
+def get_questions_answers(document_id: int, response: Response, after_id: int = None,
+                          limit: int = Query(100, ge=1, le=1000), db: Session = Depends(get_db)):
+    query = db.query(QuestionAnswer.id, QuestionAnswer.question, QuestionAnswer.answer).filter(
+        QuestionAnswer.document_id == document_id
+    )
+    if after_id is not None:
+        query = query.filter(QuestionAnswer.id > after_id)
+    questions_answers = query.order_by(QuestionAnswer.id).limit(limit + 1).all()
+
+    if not questions_answers and after_id is None:
         raise HTTPException(status_code=404, detail="No questions found for this document.")
 
+    if len(questions_answers) > limit:
+        questions_answers = questions_answers[:limit]
+        response.headers["X-Next-Cursor"] = str(questions_answers[-1].id)
+
     return [{"question": qa.question, "answer": qa.answer} for qa in questions_answers]
 
-@app.get("/documents")
-async def get_all_documents(db: Session = Depends(get_db)):
-    try:   
-        documents = db.query(Document).all()
-
-        response = []
-        for doc in documents:
-            qa_list = [
-                {"question": qa.question, "answer": qa.answer}
-                for qa in doc.question_answers
-            ]
-            response.append({
+@app.get("/health")
+def health():
+    return {"status": "ok"}
+
+@app.get("/ready")
+def ready(response: Response):
+    if not models_ready:
+        response.status_code = 503
+    return {
+        "ready": models_ready,
+        "models": inference.loaded_models() if executor.kind == "thread" else None,
+        "error": model_load_error,
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/inference/stats")
+def get_inference_stats():
+    return {
+        **scheduler.stats.snapshot(),
+        "queue_depth": scheduler.queue_depth,
+        "executor_pending": executor.pending,
+        "batch_max_size": scheduler.max_batch_size,
+        "batch_max_wait_ms": scheduler.max_wait * 1000,
+        "document_cache": document_cache.stats(),
+        "answer_cache": answer_cache.stats(),
+    }
+
+def stream_json(items, ndjson):
+    # Serialize one item at a time so large pages never exist as a single string
+    if ndjson:
+        for item in items:
+            yield json.dumps(item) + "\n"
+        return
+    yield "["
+    for i, item in enumerate(items):
+        yield ("," if i else "") + json.dumps(item)
+    yield "]"
+
+
+def document_items(document_ids, summary):
+    """Yield the documents with ``document_ids``, read from the database while the response is sent."""
+    # The request's session is closed once the handler returns, so the stream owns one
+    db = SessionLocal()
+    try:
+        if summary:
+            qa_counts = (
+                db.query(QuestionAnswer.document_id, func.count(QuestionAnswer.id).label("qa_count"))
+                .filter(QuestionAnswer.document_id.in_(document_ids))
+                .group_by(QuestionAnswer.document_id)
+                .subquery()
+            )
+            rows = db.query(
+                Document.id,
+                Document.title,
+                func.coalesce(func.length(Document.text), 0).label("size"),
+                func.coalesce(qa_counts.c.qa_count, 0).label("qa_count"),
+            ).outerjoin(qa_counts, qa_counts.c.document_id == Document.id)
+            for doc in rows.filter(Document.id.in_(document_ids)).order_by(Document.id):
+                yield {"document_id": doc.id, "title": doc.title, "size": doc.size, "qa_count": doc.qa_count}
+            return
+
+        # Only DOCUMENTS_YIELD_PER documents, with their text and Q&A, are in memory at a time
+        rows = (
+            db.query(Document)
+            .options(selectinload(Document.question_answers))
+            .filter(Document.id.in_(document_ids))
+            .order_by(Document.id)
+            .yield_per(DOCUMENTS_YIELD_PER)
+        )
+        for doc in rows:
+            yield {
                 "document_id": doc.id,
                 "title": doc.title,
-                "text": doc.text,  
-                "questions_answers": qa_list,
-            })
+                "text": doc.text,
+                "questions_answers": [
+                    {"question": qa.question, "answer": qa.answer}
+                    for qa in doc.question_answers
+                ],
+            }
+    except Exception:
+        # The status line is already sent; aborting the response at least leaves the body invalid
+        logger.exception("Error streaming documents")
+        raise
+    finally:
+        db.close()
+
 
-        return response
+@app.get("/documents")
+def get_all_documents(after_id: int = None, limit: int = Query(50, ge=1, le=500), summary: bool = False,
+                      format: Literal["json", "ndjson"] = "json", db: Session = Depends(get_db)):
+    try:
+        # Only the ids of the page are read up front, to know the next cursor
+        query = db.query(Document.id).filter(FINISHED)
+        if after_id is not None:
+            query = query.filter(Document.id > after_id)
+        document_ids = [doc_id for (doc_id,) in query.order_by(Document.id).limit(limit + 1)]
     except Exception as e:
         logger.exception("Error fetching documents")
         raise HTTPException(status_code=500, detail="An error occurred while fetching documents.")
+
+    headers = {}
+    if len(document_ids) > limit:
+        document_ids = document_ids[:limit]
+        headers["X-Next-Cursor"] = str(document_ids[-1])
+
+    media_type = "application/x-ndjson" if format == "ndjson" else "application/json"
+    items = document_items(document_ids, summary)
+    return StreamingResponse(stream_json(items, format == "ndjson"), media_type=media_type, headers=headers)
@@ -0,0 +1,182 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Seconds; spans from sub-millisecond cache lookups up to multi-minute ingestion
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help):
+        super().__init__(name, help)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(key)} {value}" for key, value in values]
+
+
+class Gauge(_Metric):
+    """Gauge whose value is read from ``callback`` at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help, callback):
+        super().__init__(name, help)
+        self.callback = callback
+
+    def render(self):
+        return self.header() + [f"{self.name} {self.callback()}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+        lines = self.header()
+        for key, values in series:
+            for bound, count in zip(self.buckets, values):
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', bound),))} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(key + (('le', '+Inf'),))} {values[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {values[-2]}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {values[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "planetai_stage_seconds", "Time spent in each pipeline stage (extract, split, embed, retrieve, generate, persist)."
+))
+QUEUE_SECONDS = REGISTRY.register(Histogram(
+    "planetai_inference_queue_seconds", "Time inference tasks waited for a free executor worker."
+))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "planetai_request_seconds", "HTTP request latency by route and status code."
+))
+REQUESTS = REGISTRY.register(Counter(
+    "planetai_requests_total", "HTTP requests handled, by route and status code."
+))
+
+
+def span(stage):
+    """Time a block of work as one ``stage`` observation."""
+    return STAGE_SECONDS.time(stage=stage)
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware recording request count and latency by route and status.
+
+    The clock stops when the last body chunk is sent, so streamed responses
+    are timed in full while background tasks that run afterwards are not.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+        recorded = False
+
+        def record():
+            nonlocal recorded
+            recorded = True
+            # Label by route template, not raw path, to keep the number of series bounded
+            route = scope.get("route")
+            labels = {"route": getattr(route, "path", "unmatched"), "status": status}
+            REQUEST_SECONDS.observe(time.perf_counter() - started, **labels)
+            REQUESTS.inc(**labels)
+
+        async def send_and_time(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                record()
+
+        try:
+            await self.app(scope, receive, send_and_time)
+        finally:
+            # The app failed or the client went away before the body was complete
+            if not recorded:
+                record()
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey
+from datetime import datetime, timezone
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, LargeBinary, DateTime
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -7,15 +8,54 @@ class Document(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
-    text = Column(Text)
+    text = Column(Text)  # NULL while the document is still being ingested
+    content_hash = Column(String(64), index=True)  # sha256 of the uploaded PDF bytes
     question_answers = relationship("QuestionAnswer", back_populates="document")
+    chunks = relationship("Chunk", back_populates="document", order_by="Chunk.position")
 
 class QuestionAnswer(Base):
     __tablename__ = "question_answers"
 
     id = Column(Integer, primary_key=True, index=True)
-    document_id = Column(Integer, ForeignKey("documents.id"))
+    document_id = Column(Integer, ForeignKey("documents.id"), index=True)
     question = Column(String, index=True)
     answer = Column(String)
 
     document = relationship("Document", back_populates="question_answers")
+
+class Chunk(Base):
+    __tablename__ = "chunks"
+
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id"), index=True, nullable=False)
+    position = Column(Integer, nullable=False)
+    start_offset = Column(Integer, nullable=False)
+    end_offset = Column(Integer, nullable=False)
+    content_hash = Column(String(64), ForeignKey("chunk_contents.content_hash"), index=True, nullable=False)
+
+    document = relationship("Document", back_populates="chunks")
+    content = relationship("ChunkContent")
+
+class ChunkContent(Base):
+    """Chunk text and embedding, stored once and shared by every document containing the chunk."""
+    __tablename__ = "chunk_contents"
+
+    content_hash = Column(String(64), primary_key=True)  # sha256 of the chunk text
+    text = Column(Text, nullable=False)
+    embedding = Column(LargeBinary, nullable=False)  # float32 vector, native byte order
+
+class IngestionJob(Base):
+    __tablename__ = "ingestion_jobs"
+
+    id = Column(String, primary_key=True)
+    title = Column(String)
+    content_hash = Column(String(64), index=True)
+    status = Column(String, nullable=False, default="queued")  # queued, processing, done, failed
+    pages_total = Column(Integer, nullable=False, default=0)
+    pages_done = Column(Integer, nullable=False, default=0)
+    chunks_done = Column(Integer, nullable=False, default=0)
+    document_id = Column(Integer, ForeignKey("documents.id"), nullable=True)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc),
+                        onupdate=lambda: datetime.now(timezone.utc))
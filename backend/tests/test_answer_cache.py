@@ -0,0 +1,82 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+import answer_cache
+from answer_cache import AnswerCache, normalize_question
+
+
+def test_exact_tier_matches_normalized_question():
+    cache = AnswerCache()
+    cache.put(1, "What is a Planet?", "a body")
+
+    assert normalize_question("  what is a planet ") == "what is a planet"
+    assert cache.get_exact(1, "what is a planet") == "a body"
+    assert cache.get_exact(2, "what is a planet") is None
+    assert cache.exact_hits == 1
+
+
+def test_semantic_tier_uses_similarity_threshold():
+    cache = AnswerCache(similarity_threshold=0.9)
+    cache.put(1, "orbit period", "365 days", embedding=[1.0, 0.0])
+
+    assert cache.get_similar(1, [0.99, 0.05]) == "365 days"
+    assert cache.get_similar(1, [0.5, 0.5]) is None
+    assert cache.get_similar(2, [1.0, 0.0]) is None
+    assert (cache.semantic_hits, cache.misses) == (1, 2)
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "monotonic", lambda: now[0])
+    cache = AnswerCache(ttl=10)
+    cache.put(1, "q", "a", embedding=[1.0, 0.0])
+
+    now[0] += 11
+
+    assert cache.get_exact(1, "q") is None
+    assert cache.get_similar(1, [1.0, 0.0]) is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = AnswerCache(max_entries=2)
+    cache.put(1, "a", "A")
+    cache.put(1, "b", "B")
+    cache.get_exact(1, "a")
+    cache.put(1, "c", "C")
+
+    assert cache.get_exact(1, "b") is None
+    assert cache.get_exact(1, "a") == "A"
+    assert cache.get_exact(1, "c") == "C"
+
+
+def test_invalidate_drops_a_documents_entries():
+    cache = AnswerCache()
+    cache.put(1, "a", "A")
+    cache.put(2, "a", "A2")
+
+    cache.invalidate(1)
+
+    assert cache.get_exact(1, "a") is None
+    assert cache.get_exact(2, "a") == "A2"
+
+
+def test_seed_marks_are_dropped_with_the_last_entry():
+    cache = AnswerCache(max_entries=1)
+    cache.load(1, [("a", "A")])
+    cache.load(2, [("b", "B")])  # evicts document 1's only entry
+
+    assert not cache.is_loaded(1)
+    assert cache.is_loaded(2)
+
+
+def test_invalidate_records_which_stored_answers_are_stale():
+    cache = AnswerCache()
+    cache.load(1, [("a", "A")])
+
+    cache.invalidate(1, valid_after=42)
+
+    assert not cache.is_loaded(1)
+    assert cache.valid_after(1) == 42
+    assert cache.valid_after(2) == 0
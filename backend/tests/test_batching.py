@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+import inference
+from backends import StubGenerator
+from batching import BatchScheduler
+from inference import InferenceExecutor, InferenceOverloaded
+
+
+@pytest.fixture(autouse=True)
+def stub_generator(monkeypatch):
+    monkeypatch.setitem(inference._models, "qa", StubGenerator(batch_ms=20, prompt_ms=1))
+
+
+def ask_at_once(scheduler, questions, prompts_per_question):
+    async def ask(i):
+        prompts = [f"Question: q{i}\nContext: chunk {j} of question {i}" for j in range(prompts_per_question)]
+        try:
+            return await scheduler.generate_many(prompts)
+        except InferenceOverloaded as e:
+            return e
+
+    async def burst():
+        try:
+            return await asyncio.gather(*(ask(i) for i in range(questions)))
+        finally:
+            await scheduler.stop()
+
+    return asyncio.run(burst())
+
+
+def test_default_bound_admits_a_burst_that_fits_in_full_batches():
+    executor = InferenceExecutor(max_workers=2, max_queue=16)
+    scheduler = BatchScheduler(executor, max_batch_size=8)
+    try:
+        results = ask_at_once(scheduler, questions=10, prompts_per_question=3)
+    finally:
+        executor.shutdown()
+
+    assert not [r for r in results if isinstance(r, InferenceOverloaded)]
+    assert [answers[0].split()[-1] for answers in results] == [str(i) for i in range(10)]
+    assert scheduler.stats.prompts == 30
+
+
+def test_rejects_a_question_whose_prompts_do_not_fit():
+    executor = InferenceExecutor(max_workers=1, max_queue=0)
+    scheduler = BatchScheduler(executor, max_batch_size=8, max_queue=4)
+    try:
+        results = ask_at_once(scheduler, questions=2, prompts_per_question=3)
+    finally:
+        executor.shutdown()
+
+    assert isinstance(results[1], InferenceOverloaded)
+    assert len(results[0]) == 3
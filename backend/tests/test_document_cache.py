@@ -0,0 +1,46 @@
+from document_cache import LRUCache
+
+
+class Sized:
+    def __init__(self, nbytes):
+        self.nbytes = nbytes
+
+
+def test_tracks_bytes_and_evicts_least_recently_used():
+    cache = LRUCache(max_bytes=100)
+    cache.put(1, Sized(40))
+    cache.put(2, Sized(40))
+    assert cache.get(1) is not None  # 2 is now the least recently used
+    cache.put(3, Sized(40))
+
+    assert 1 in cache and 3 in cache and 2 not in cache
+    assert cache.current_bytes == 80
+
+
+def test_replacing_a_key_does_not_double_count():
+    cache = LRUCache(max_bytes=100)
+    cache.put(1, Sized(60))
+    cache.put(1, Sized(30))
+
+    assert len(cache) == 1
+    assert cache.current_bytes == 30
+
+
+def test_value_larger_than_budget_is_not_cached():
+    cache = LRUCache(max_bytes=100)
+    cache.put(1, Sized(50))
+    cache.put(2, Sized(150))
+
+    assert 2 not in cache
+    assert 1 in cache
+    assert cache.current_bytes == 50
+
+
+def test_pop_releases_bytes_and_counts_hits_and_misses():
+    cache = LRUCache(max_bytes=100)
+    cache.put(1, Sized(50))
+    cache.get(1)
+    cache.get(2)
+    cache.pop(1)
+
+    assert cache.stats() == {"entries": 0, "bytes": 0, "max_bytes": 100, "hits": 1, "misses": 1}
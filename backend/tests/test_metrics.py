@@ -0,0 +1,59 @@
+import asyncio
+import time
+
+import metrics
+from metrics import RequestMetricsMiddleware
+
+
+class Route:
+    path = "/documents"
+
+
+def observed(monkeypatch):
+    observations = []
+    monkeypatch.setattr(metrics.REQUEST_SECONDS, "observe",
+                        lambda seconds, **labels: observations.append((seconds, labels)))
+    monkeypatch.setattr(metrics.REQUESTS, "inc", lambda **labels: None)
+    return observations
+
+
+def call(app):
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        pass
+
+    asyncio.run(RequestMetricsMiddleware(app)({"type": "http"}, receive, send))
+
+
+def test_times_the_streamed_body_but_not_background_work(monkeypatch):
+    observations = observed(monkeypatch)
+
+    async def app(scope, receive, send):
+        scope["route"] = Route()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"[", "more_body": True})
+        await asyncio.sleep(0.05)
+        await send({"type": "http.response.body", "body": b"]"})
+        time.sleep(0.2)  # background task after the response
+
+    call(app)
+
+    [(seconds, labels)] = observations
+    assert labels == {"route": "/documents", "status": 200}
+    assert 0.05 <= seconds < 0.2
+
+
+def test_records_failures_as_500(monkeypatch):
+    observations = observed(monkeypatch)
+
+    async def app(scope, receive, send):
+        raise RuntimeError("boom")
+
+    try:
+        call(app)
+    except RuntimeError:
+        pass
+
+    assert [labels for _, labels in observations] == [{"route": "unmatched", "status": 500}]
@@ -0,0 +1,58 @@
+import pytest
+
+text_splitter = pytest.importorskip("langchain.text_splitter")
+
+import inference
+
+
+@pytest.fixture
+def small_splitter(monkeypatch):
+    splitter = text_splitter.RecursiveCharacterTextSplitter(chunk_size=60, chunk_overlap=10, add_start_index=True)
+    monkeypatch.setitem(inference._models, "splitter", splitter)
+
+
+def split_streaming(pages):
+    """Feed pages through split_text the way ingestion does; returns (chunk, absolute offset) pairs."""
+    carry, carry_offset, chunks = "", 0, []
+    for number, page in enumerate(pages):
+        buffer = carry + page
+        text_chunks, offsets, carry_start = inference.split_text(buffer, final=number == len(pages) - 1)
+        chunks.extend((chunk, carry_offset + offset) for chunk, offset in zip(text_chunks, offsets))
+        carry, carry_offset = buffer[carry_start:], carry_offset + carry_start
+    return chunks
+
+
+def test_final_split_keeps_every_chunk(small_splitter):
+    text = " ".join(f"word{i}" for i in range(40))
+
+    text_chunks, offsets, carry_start = inference.split_text(text)
+
+    assert carry_start == len(text)
+    assert all(text[start:start + len(chunk)] == chunk for chunk, start in zip(text_chunks, offsets))
+
+
+def test_non_final_split_holds_back_last_chunk(small_splitter):
+    text = " ".join(f"word{i}" for i in range(40))
+
+    text_chunks, offsets, carry_start = inference.split_text(text, final=False)
+    all_chunks, all_offsets, _ = inference.split_text(text)
+
+    assert text_chunks == all_chunks[:-1]
+    assert carry_start == all_offsets[-1]
+
+
+def test_streamed_offsets_point_into_the_full_text(small_splitter):
+    pages = [" ".join(f"p{page}w{i}" for i in range(25)) + "\n" for page in range(4)]
+    full_text = "".join(pages)
+
+    chunks = split_streaming(pages)
+
+    assert chunks
+    assert all(full_text[start:start + len(chunk)] == chunk for chunk, start in chunks)
+    # Nothing is lost at page boundaries: the last chunk reaches the end of the text
+    last_chunk, last_start = chunks[-1]
+    assert full_text.rstrip().endswith(last_chunk.rstrip())
+
+
+def test_blank_text_has_no_chunks(small_splitter):
+    assert inference.split_text("   \n", final=True) == ([], [], 4)
@@ -0,0 +1,40 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from vector_index import VectorIndex, decode_embedding, encode_embedding
+
+
+def test_search_returns_best_matches_first():
+    index = VectorIndex(["x", "y", "z"], np.eye(3))
+
+    hits = index.search([0.1, 1.0, 0.5], top_k=2)
+
+    assert [i for i, _ in hits] == [1, 2]
+    assert hits[0][1] > hits[1][1]
+
+
+def test_top_k_larger_than_index_returns_everything():
+    index = VectorIndex(["x", "y"], [[1, 0], [0, 1]])
+
+    assert sorted(i for i, _ in index.search([1, 1], top_k=10)) == [0, 1]
+
+
+def test_empty_index():
+    index = VectorIndex([], [])
+
+    assert len(index) == 0
+    assert index.search([1.0, 0.0], top_k=3) == []
+
+
+def test_rows_round_trip_through_embedding_blobs():
+    class Row:
+        def __init__(self, text, embedding):
+            self.text = text
+            self.embedding = encode_embedding(embedding)
+
+    index = VectorIndex.from_rows([Row("x", [3.0, 0.0]), Row("y", [0.0, 2.0])])
+
+    assert index.chunks == ["x", "y"]
+    assert np.allclose(index.embeddings, [[1, 0], [0, 1]])
+    assert np.allclose(decode_embedding(encode_embedding([1.5, -2.0])), [1.5, -2.0])
@@ -0,0 +1,69 @@
+import numpy as np
+
+try:
+    import faiss
+except ImportError:  # FAISS is optional, fall back to brute-force NumPy search
+    faiss = None
+
+
+class VectorIndex:
+    """Inner-product index over L2-normalized chunk embeddings of one document."""
+
+    def __init__(self, chunks, embeddings):
+        self.chunks = list(chunks)
+        if self.chunks:
+            self.embeddings = _normalize(np.asarray(embeddings, dtype="float32").reshape(len(self.chunks), -1))
+        else:
+            self.embeddings = np.zeros((0, 0), dtype="float32")
+        self._faiss_index = None
+        if faiss is not None and len(self.chunks):
+            self._faiss_index = faiss.IndexFlatIP(self.embeddings.shape[1])
+            self._faiss_index.add(self.embeddings)
+
+    def __len__(self):
+        return len(self.chunks)
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by this index, used for cache budgeting."""
+        return self.embeddings.nbytes * (2 if self._faiss_index is not None else 1) + sum(
+            len(chunk) for chunk in self.chunks
+        )
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build an index from ``Chunk`` rows ordered by position."""
+        return cls([row.text for row in rows], [decode_embedding(row.embedding) for row in rows])
+
+    def search(self, query_embedding, top_k):
+        """Return up to ``top_k`` ``(chunk_index, score)`` pairs, best first."""
+        if not self.chunks:
+            return []
+        top_k = min(top_k, len(self.chunks))
+        query = _normalize(np.asarray(query_embedding, dtype="float32").reshape(1, -1))
+
+        if self._faiss_index is not None:
+            scores, ids = self._faiss_index.search(query, top_k)
+            return [(int(i), float(s)) for i, s in zip(ids[0], scores[0]) if i != -1]
+
+        scores = self.embeddings @ query[0]
+        if top_k < len(scores):
+            ids = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            ids = np.arange(len(scores))
+        ids = ids[np.argsort(-scores[ids])]
+        return [(int(i), float(scores[i])) for i in ids]
+
+
+def encode_embedding(vector):
+    return np.asarray(vector, dtype="float32").tobytes()
+
+
+def decode_embedding(blob):
+    return np.frombuffer(blob, dtype="float32")
+
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
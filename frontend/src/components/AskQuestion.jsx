@@ -12,10 +12,18 @@ const AskQuestion = ({ documentId }) => {
   useEffect(() => {
     const fetchChatHistory = async () => {
       try {
-        const response = await axios.get(
-          `http://127.0.0.1:8000/document/${documentId}/questions`
-        );
-        setChatHistory(response.data);
+        // History is paginated; follow the cursor until the last page
+        let history = [];
+        let cursor = null;
+        do {
+          const response = await axios.get(
+            `http://127.0.0.1:8000/document/${documentId}/questions`,
+            { params: cursor ? { after_id: cursor } : {} }
+          );
+          history = history.concat(response.data);
+          cursor = response.headers["x-next-cursor"];
+        } while (cursor);
+        setChatHistory(history);
       } catch (error) {
         console.error("Error fetching chat history", error);
       }
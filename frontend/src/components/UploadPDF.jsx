@@ -2,6 +2,18 @@ import React, { useState } from "react";
 import axios from "axios";
 import icon from "../assets/icon.png";
 
+const API_URL = "http://localhost:8000";
+
+const waitForIngestion = async (jobId) => {
+  // Uploads are processed in the background; poll until the document is indexed
+  for (;;) {
+    const { data } = await axios.get(`${API_URL}/upload_status/${jobId}`);
+    if (data.status === "done") return data.document_id;
+    if (data.status === "failed") throw new Error(data.error);
+    await new Promise((resolve) => setTimeout(resolve, 1000));
+  }
+};
+
 const UploadPDF = ({ onUploadSuccess }) => {
   const [file, setFile] = useState(null);
 
@@ -18,7 +30,7 @@ const UploadPDF = ({ onUploadSuccess }) => {
 
     try {
       const response = await axios.post(
-        "http://localhost:8000/upload_pdf",
+        `${API_URL}/upload_pdf`,
         formData,
         {
           headers: {
@@ -26,7 +38,12 @@ const UploadPDF = ({ onUploadSuccess }) => {
           },
         }
       );
-      onUploadSuccess(response.data.document_id);
+      // Duplicate uploads resolve straight to the existing document
+      const documentId =
+        response.data.status === "done"
+          ? response.data.document_id
+          : await waitForIngestion(response.data.job_id);
+      onUploadSuccess(documentId);
     } catch (error) {
       console.error("Error uploading PDF", error);
     }